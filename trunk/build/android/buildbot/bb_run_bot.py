@@ -5,7 +5,6 @@
 # found in the LICENSE file.
 
 import collections
-import copy
 import json
 import optparse
 import os
@@ -22,6 +21,7 @@ CHROME_SRC = os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 GLOBAL_SLAVE_PROPS = {}
+_EMPTY_SLAVE_JSON = json.dumps({})
 
 BotConfig = collections.namedtuple(
     'BotConfig', ['bot_id', 'host_opts', 'test_obj', 'slave_props'])
@@ -41,62 +41,74 @@ def GetCommands(options, bot_config):
   Returns:
     list of Command objects.
   """
-  slave_props = dict(GLOBAL_SLAVE_PROPS)
-  if bot_config.slave_props:
-    slave_props.update(bot_config.slave_props)
-
-  slave_properties = json.dumps(slave_props)
+  if not GLOBAL_SLAVE_PROPS and not bot_config.slave_props:
+    slave_properties = _EMPTY_SLAVE_JSON
+  else:
+    slave_props = dict(GLOBAL_SLAVE_PROPS)
+    if bot_config.slave_props:
+      slave_props.update(bot_config.slave_props)
+    slave_properties = json.dumps(slave_props, sort_keys=True)
   property_args = [
       '--factory-properties=%s' % json.dumps(options.factory_properties),
       '--build-properties=%s' % json.dumps(options.build_properties),
       '--slave-properties=%s' % slave_properties]
 
   commands = []
+  bash_setup = '; '.join([
+      '. build/android/buildbot/buildbot_functions.sh',
+      'bb_baseline_setup %s --slave-properties=%s' % (
+          CHROME_SRC, pipes.quote(slave_properties)),
+      'exec "$@"'])
   def WrapWithBash(command):
-    """Wrap a bash command string with envsetup scripts."""
-    return ['bash', '-exc', '; '.join([
-        '. build/android/buildbot/buildbot_functions.sh',
-        'bb_baseline_setup %s --slave-properties=%s' % (
-            CHROME_SRC, pipes.quote(slave_properties)),
-        command])
-    ]
+    """Wrap a command list with envsetup scripts.
+
+    The command is passed to bash as positional arguments, so it needs no
+    shell quoting.
+    """
+    return ['bash', '-exc', bash_setup, 'bash'] + command
 
   if bot_config.host_opts:
     host_cmd = (['build/android/buildbot/bb_host_steps.py'] +
-                bot_config.host_opts + property_args)
-    commands.append(Command(
-        'Host steps',
-        WrapWithBash(' '.join(map(pipes.quote, host_cmd))), host_cmd))
+                list(bot_config.host_opts) + property_args)
+    commands.append(Command('Host steps', WrapWithBash(host_cmd), host_cmd))
 
   test_obj = bot_config.test_obj
   if test_obj:
-    run_test_cmd = [
-        'build/android/buildbot/bb_device_steps.py', '--reboot'] + property_args
-    for test in test_obj.tests:
-      run_test_cmd.extend(['-f', test])
+    test_flags = [arg for test in test_obj.tests for arg in ('-f', test)]
+    run_test_cmd = (['build/android/buildbot/bb_device_steps.py', '--reboot'] +
+                    property_args + test_flags)
     if test_obj.extra_args:
       run_test_cmd.extend(test_obj.extra_args)
     commands.append(Command(
-        'Run tests',
-        WrapWithBash(' '.join(map(pipes.quote, run_test_cmd))), run_test_cmd))
+        'Run tests', WrapWithBash(run_test_cmd), run_test_cmd))
 
   return commands
 
 
-def GetBotStepMap():
-  compile_opt = ['--compile']
-  std_host_tests = ['--host-tests=check_webview_licenses,findbugs']
-  std_build_opts = ['--compile', '--zip-build']
-  std_test_opts = ['--extract-build']
-  std_tests = ['ui', 'unit']
+def _BuildBotStepMap():
+  compile_opt = ('--compile',)
+  std_host_tests = ('--host-tests=check_webview_licenses,findbugs',)
+  std_build_opts = ('--compile', '--zip-build')
+  std_test_opts = ('--extract-build',)
+  std_tests = ('ui', 'unit')
   flakiness_server = '--upload-to-flakiness-server'
   extra_gyp = 'extra_gyp_defines'
 
   def B(bot_id, bash_funs, test_obj=None, slave_props=None):
-    return BotConfig(bot_id, bash_funs, test_obj, slave_props)
+    return BotConfig(bot_id, tuple(bash_funs), test_obj, slave_props)
 
   def T(tests, extra_args=None):
-    return TestConfig(tests, extra_args)
+    return TestConfig(tuple(tests), extra_args and tuple(extra_args))
+
+  def StripFlakiness(test_obj):
+    """Returns test_obj without the flakiness dashboard upload argument."""
+    if not test_obj or not test_obj.extra_args:
+      return test_obj
+    # pylint: disable=W0212
+    return test_obj._replace(extra_args=tuple(
+        a for a in test_obj.extra_args if a != flakiness_server))
+
+  fyi_std_tests = T(std_tests, ['--experimental', flakiness_server])
 
   bot_configs = [
       # Main builders
@@ -107,19 +119,17 @@ def GetBotStepMap():
       B('main-tests', std_test_opts, T(std_tests, [flakiness_server])),
 
       # Other waterfalls
-      B('asan-builder-tests', compile_opt + ['--update-clang'],
+      B('asan-builder-tests', compile_opt + ('--update-clang',),
         T(std_tests, ['--asan']), {extra_gyp: 'asan=1'}),
       B('chromedriver-fyi-tests-dbg', std_test_opts,
         T(['chromedriver'], ['--install=ChromiumTestShell'])),
       B('fyi-builder-dbg',
-        std_build_opts + std_host_tests + ['--experimental']),
-      B('fyi-builder-rel', std_build_opts + ['--experimental']),
-      B('fyi-tests-dbg-ics-gn', compile_opt + [ '--experimental'],
-        T(std_tests, ['--experimental', flakiness_server])),
-      B('fyi-tests', std_test_opts,
-        T(std_tests, ['--experimental', flakiness_server])),
-      B('fyi-component-builder-tests-dbg', compile_opt,
-        T(std_tests, ['--experimental', flakiness_server]),
+        std_build_opts + std_host_tests + ('--experimental',)),
+      B('fyi-builder-rel', std_build_opts + ('--experimental',)),
+      B('fyi-tests-dbg-ics-gn', compile_opt + ('--experimental',),
+        fyi_std_tests),
+      B('fyi-tests', std_test_opts, fyi_std_tests),
+      B('fyi-component-builder-tests-dbg', compile_opt, fyi_std_tests,
         {extra_gyp: 'component=shared_library'}),
       B('perf-tests-rel', std_test_opts, T([], ['--install=ContentShell'])),
       B('webkit-latest-webkit-tests', std_test_opts,
@@ -144,21 +154,32 @@ def GetBotStepMap():
       ('try-fyi-tests', 'fyi-tests'),
       ('webkit-latest-tests', 'main-tests'),
   ]
+  to_ids = [to_id for to_id, _ in copy_map]
+  assert len(set(to_ids)) == len(to_ids)
+  assert not set(to_ids) & set(bot_map)
   for to_id, from_id in copy_map:
-    assert to_id not in bot_map
-    # pylint: disable=W0212
-    bot_map[to_id] = copy.deepcopy(bot_map[from_id])._replace(bot_id=to_id)
-
+    src = bot_map[from_id]
+    test_obj = src.test_obj
     # Trybots do not upload to flakiness dashboard. They should be otherwise
     # identical in configuration to their trunk building counterparts.
-    test_obj = bot_map[to_id].test_obj
-    if to_id.startswith('try') and test_obj:
-      extra_args = test_obj.extra_args
-      if extra_args and flakiness_server in extra_args:
-        extra_args.remove(flakiness_server)
+    if to_id.startswith('try'):
+      test_obj = StripFlakiness(test_obj)
+    # pylint: disable=W0212
+    bot_map[to_id] = src._replace(bot_id=to_id, test_obj=test_obj)
   return bot_map
 
 
+# The bot map only depends on the definitions above, so build it once at import
+# time instead of on every lookup.
+_BOT_MAP = _BuildBotStepMap()
+# Longest ids first, so the first substring match is also the longest one.
+_BOT_IDS_BY_LEN = sorted(_BOT_MAP, key=len, reverse=True)
+
+
+def GetBotStepMap():
+  return _BOT_MAP
+
+
 def main(argv):
   parser = optparse.OptionParser()
 
@@ -186,14 +207,13 @@ def main(argv):
   # match, look for a bot-id which is a substring of the specified id.
   # This allows similar bots to have unique IDs, but to share config.
   # If multiple substring matches exist, pick the longest one.
-  bot_map = GetBotStepMap()
-  bot_config = bot_map.get(bot_id)
+  bot_config = _BOT_MAP.get(bot_id)
   if not bot_config:
-    substring_matches = filter(lambda x: x in bot_id, bot_map.iterkeys())
-    if substring_matches:
-      max_id = max(substring_matches, key=len)
-      print 'Using config from id="%s" (substring match).' % max_id
-      bot_config = bot_map[max_id]
+    for max_id in _BOT_IDS_BY_LEN:
+      if max_id in bot_id:
+        print 'Using config from id="%s" (substring match).' % max_id
+        bot_config = _BOT_MAP[max_id]
+        break
   if not bot_config:
     print 'Error: config for id="%s" cannot be inferred.' % bot_id
     return 1
@@ -201,8 +221,9 @@ def main(argv):
   print 'Using config:', bot_config
 
   command_objs = GetCommands(options, bot_config)
-  for command_obj in command_objs:
-    print 'Will run:', CommandToString(command_obj.command)
+  # Keep the up-front summary for log readability, but emit it in one write.
+  print '\n'.join('Will run: %s' % CommandToString(command_obj.command)
+                  for command_obj in command_objs)
 
   for command_obj in command_objs:
     if command_obj.step_name: